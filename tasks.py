@@ -21,10 +21,17 @@
 # **************************************************
 
 import sys
+import os
+import atexit
+import json
 import re
+import shlex
 import subprocess
+import tempfile
 import datetime
-from typing import List
+import mmap
+import concurrent.futures
+from typing import Callable, Dict, List, Tuple
 import magic
 from invoke import task
 import functools
@@ -34,6 +41,12 @@ import functools
 # ***************************************************
 
 
+@functools.lru_cache(maxsize=None)
+def get_repo_root() -> str:
+    """Return the root of the git repo. e.g /home/ag474u/Code/vplane-config-qos"""
+    return subprocess.check_output(['git', 'rev-parse', '--show-toplevel']).decode("utf-8").rstrip()
+
+
 @functools.lru_cache(maxsize=1)
 def get_files(commits: str) -> List:
     def get_all_files(repo_root: str) -> List:
@@ -43,9 +56,11 @@ def get_files(commits: str) -> List:
         # any file extension. Therefore it is necessary to pass every file to these tools so no files are
         # left out.
 
-        git_command = "git ls-tree -r --full-name --name-only HEAD"
-        result = subprocess.check_output(git_command, shell=True).decode("utf-8")
-        all_files = result.splitlines()
+        # Only tracked files are listed, so untracked build output (e.g. deb_packages/ from the
+        # package stage) is never checked. The file names are NUL-terminated.
+        git_command = ["git", "ls-files", "-z", "--cached"]
+        result = subprocess.check_output(git_command, cwd=repo_root).decode("utf-8")
+        all_files = [s for s in result.split("\0") if s]
         all_files_full_path = [repo_root + '/' + s for s in all_files]
         return all_files_full_path
 
@@ -60,8 +75,7 @@ def get_files(commits: str) -> List:
         changed_files_full_path = [repo_root + '/' + s for s in changed_files]
         return changed_files_full_path
 
-    # Get the root of the git repo. e.g /home/ag474u/Code/vplane-config-qos.
-    repo_root = subprocess.check_output(['git', 'rev-parse', '--show-toplevel']).decode("utf-8").rstrip()
+    repo_root = get_repo_root()
 
     if commits == "all":
         return get_all_files(repo_root)
@@ -69,27 +83,95 @@ def get_files(commits: str) -> List:
         return get_changed_files(repo_root, commits)
 
 
+# The libmagic instance used to identify files by their contents
+_MAGIC = magic.Magic()
+
+# File types that can be identified by their file extension alone.
+# python-magic does not recognise yang or markdown files, and for the others
+# this avoids calling into libmagic for most of the files in this repo.
+# Shell scripts are left to libmagic as they may be bash or POSIX shell.
+FILE_TYPES_BY_EXTENSION = {
+    "py": "Python script",
+    "pl": "Perl script",
+    "pm": "Perl5 module source",
+    "yang": "Yang",
+    "md": "Markdown",
+}
+
+
+@functools.lru_cache(maxsize=1)
+def get_file_type_cache() -> Dict[str, List]:
+    """Return the python-magic results saved by previous runs, keyed by file path. Each entry is
+        [modification time in ns, size, file type]. The results are saved again when invoke exits"""
+
+    git_dir = subprocess.check_output(['git', 'rev-parse', '--absolute-git-dir']).decode("utf-8").rstrip()
+    cache_file = os.path.join(git_dir, "tasks-file-types.json")
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    def save_file_type_cache() -> None:
+        # Stages may run in parallel against the same checkout. Write a temporary file and
+        # rename it over the cache, so the cache is never left partially written.
+        with tempfile.NamedTemporaryFile('w', dir=git_dir, prefix="tasks-file-types.",
+                                         suffix=".tmp", delete=False) as f:
+            json.dump(cache, f)
+        os.replace(f.name, cache_file)
+
+    atexit.register(save_file_type_cache)
+    return cache
+
+
+@functools.lru_cache(maxsize=None)
+def get_file_type(file: str) -> str:
+    """Return the type of 'file', either from its file extension or using python-magic"""
+    stat = os.stat(file)
+    file_type = None
+    # libmagic reports empty files (e.g. an empty __init__.py) as "empty", so don't let the
+    # extension claim them as a type that the stages would then check
+    if stat.st_size != 0:
+        file_extension = file.split('.').pop()
+        file_type = FILE_TYPES_BY_EXTENSION.get(file_extension)
+    if file_type is None:
+        # Only ask libmagic about files that have changed since it was last asked
+        cache = get_file_type_cache()
+        entry = cache.get(file)
+        if entry is not None and entry[:2] == [stat.st_mtime_ns, stat.st_size]:
+            file_type = entry[2]
+        else:
+            file_type = _MAGIC.from_file(file)
+            cache[file] = [stat.st_mtime_ns, stat.st_size, file_type]
+    return file_type
+
+
 def get_files_by_types(files: List, types: List[str]) -> List:
     """Return a subset of 'files' based of the file type. Use python-magic rather simply
         looking at the file extension because some of the scripts do not have any file extension"""
 
+    # The stages share the cached result when they ask for the same types of the same files
+    return list(get_cached_files_by_types(tuple(files), tuple(types)))
+
+
+@functools.lru_cache(maxsize=None)
+def get_cached_files_by_types(files: Tuple[str, ...], types: Tuple[str, ...]) -> Tuple[str, ...]:
     files_by_types = []
     for file in files:
-        file_type = magic.from_file(file)
+        file_type = get_file_type(file)
         if any(specified_type in file_type for specified_type in types):
             files_by_types.append(file)
-        # python-magic does not recognise yang files so find them using their file extension
-        else:
-            if "Yang" in types:
-                file_extension = file.split('.').pop()
-                if file_extension == "yang":
-                    files_by_types.append(file)
-            if "Markdown" in types:
-                file_extension = file.split('.').pop()
-                if file_extension == "md":
-                    files_by_types.append(file)
 
-    return files_by_types
+    return tuple(files_by_types)
+
+
+def check_files(check: Callable[[str], bool], files: List[str]) -> List[bool]:
+    """Return the result of calling 'check' on each file in 'files'. The checks are IO bound
+        so run them in a pool of threads to overlap reading the files"""
+
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(check, files))
 
 # ***************************************************
 # Stages of the pipeline
@@ -102,7 +184,7 @@ def flake8(context, commits="master...HEAD"):
     files = get_files(commits)
     python_files = get_files_by_types(files, ["Python"])
     if python_files:  # Only run flake8 if there are files to check (otherwise it will run it over the directory)
-        python_files = " ".join(python_files)
+        python_files = " ".join(shlex.quote(file) for file in python_files)
         context.run(f"python3 -m flake8 --count {python_files}", echo=True)
 
 
@@ -112,7 +194,7 @@ def mypy(context, commits="master...HEAD"):
     files = get_files(commits)
     python_files = get_files_by_types(files, ["Python"])
     if python_files:  # Only run mypy if there are files to check (otherwise it will run it over the directory)
-        python_files = " ".join(python_files)
+        python_files = " ".join(shlex.quote(file) for file in python_files)
         context.run(f"mypy {python_files}", echo=True)
 
 
@@ -146,30 +228,42 @@ def gitlint(context, commits="master...HEAD"):
 def licence(context, commits="master...HEAD"):
     """Check source code files contain the spdx licence and an up to date AT&T licence"""
 
+    # Every file must have a copyright for the current year
+    year = datetime.datetime.now().year
+    att_pattern = re.compile(rf"Copyright \(c\) .*{year}.* AT&T Intellectual Property")
+
+    def has_att_licence(file: str) -> bool:
+        with open(file) as f:
+            for line in f:
+                match = att_pattern.search(line)
+                if match:
+                    return True
+        return False
+
+    def has_spdx_licence(file: str) -> bool:
+        # Search the raw bytes of the memory mapped file
+        pattern = b"SPDX-License-Identifier:"
+        with open(file, 'rb') as f:
+            # An empty file can't be mapped, and can't contain the licence either
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm.find(pattern) != -1
+
     def check_att_licence(source_files: List[str]) -> bool:
         error = False
-        for file in source_files:
-            year = datetime.datetime.now().year
-            pattern = rf"Copyright \(c\) .*{year}.* AT&T Intellectual Property"
-
-            with open(file) as f:
-                for line in f:
-                    match = re.search(pattern, line)
-                    if match:
-                        break
-                else:
-                    print(f"Failed: File {file} does not contain AT&T licence for the current year ({year})")
-                    error = True
+        for file, result in zip(source_files, check_files(has_att_licence, source_files)):
+            if not result:
+                print(f"Failed: File {file} does not contain AT&T licence for the current year ({year})")
+                error = True
         return error
 
     def check_spdx_licence(source_files: List[str]) -> bool:
         error = False
-        for file in source_files:
-            pattern = r"SPDX-License-Identifier:"
-            with open(file) as f:
-                if pattern not in f.read():
-                    print(f"Failed: File {file} does not contain SPDX licence")
-                    error = True
+        for file, result in zip(source_files, check_files(has_spdx_licence, source_files)):
+            if not result:
+                print(f"Failed: File {file} does not contain SPDX licence")
+                error = True
         return error
 
     files = get_files(commits)
@@ -187,7 +281,7 @@ def whitespace(context, commits="master...HEAD"):
     # Remove markdown files as they use trailing whitespace
     markdown_files = get_files_by_types(files, ["Markdown"])
     files = set(files) - set(markdown_files)
-    files_str = " ".join(files)
+    files_str = " ".join(shlex.quote(file) for file in files)
 
     # Grep for white space before end of line
     # Exclaimation mark at the start inverts the return code so matches are errors
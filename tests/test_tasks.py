@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2021, AT&T Intellectual Property.
+# All rights reserved.
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+#
+
+"""
+Unit-tests for the tasks.py file type detection.
+"""
+
+import pytest
+
+pytest.importorskip("magic")
+pytest.importorskip("invoke")
+
+import tasks  # noqa: E402
+
+
+def test_get_file_type_empty_python_file(tmp_path, monkeypatch):
+    """
+    An empty .py file (e.g. __init__.py) isn't a Python script as far as
+    libmagic is concerned, so the stages mustn't check it.
+    """
+    monkeypatch.setattr(tasks, "get_file_type_cache", lambda: {})
+    empty_file = tmp_path / "__init__.py"
+    empty_file.touch()
+    python_file = tmp_path / "module.py"
+    python_file.write_text("import os\n")
+
+    assert "Python" not in tasks.get_file_type(str(empty_file))
+    assert tasks.get_file_type(str(python_file)) == "Python script"
+    assert tasks.get_files_by_types([str(empty_file), str(python_file)],
+                                    ["Python"]) == [str(python_file)]
@@ -722,3 +722,19 @@ def test_compare_bond_member_interface():
     if2 = Interface('bond_member', SIAD_BONDED_IF_MEMBER_DICT, QOS_POLICY_DICT,
                     {}, {}, bond_dict=bond_pol_2)
     assert if1 != if2
+
+
+def test_compare_interfaces_by_name():
+    """
+    Interfaces with different names are never equal, identical interfaces
+    are, and interfaces can be used in sets.
+    """
+    if1 = Interface('dataplane', VM_IF_DICT, QOS_POLICY_DICT, {}, {})
+    if2 = Interface('dataplane', VM_IF_DICT, QOS_POLICY_DICT, {}, {})
+    if3 = Interface('dataplane', dict(VM_IF_DICT, tagnode='dp0s5'),
+                    QOS_POLICY_DICT, {}, {})
+    assert if1 == if1
+    assert if1 == if2
+    assert if1 != if3
+    assert if1 != "lo"
+    assert len({if1, if2, if3}) == 2
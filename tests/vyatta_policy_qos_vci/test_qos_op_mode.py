@@ -11,9 +11,10 @@ Unit-tests for the qos_op_mode.py module.
 """
 
 import json
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 import vyatta_policy_qos_vci.qos_op_mode
 import pathlib
+import pytest
 
 
 def test_qos_op_mode():
@@ -77,3 +78,211 @@ def test_qos_op_mode():
 
             expected_if_list = expected_results['state']
             assert yang_dict == expected_if_list
+
+
+def test_get_if_subport_policy_name():
+    """
+    Unit-test the subport to policy name lookup, including the lookup of a
+    bonding group member's policy from the bonding group.
+    """
+    config = {
+        'vyatta-interfaces-v1:interfaces': {
+            'vyatta-interfaces-bonding-v1:bonding': [
+                {
+                    'tagnode': 'dp0bond1',
+                    'vyatta-interfaces-policy-v1:policy': {
+                        'vyatta-interfaces-bonding-qos-v1:qos': 'policy-1'
+                    }
+                }
+            ],
+            'vyatta-interfaces-dataplane-v1:dataplane': [
+                {'tagnode': 'dp0xe3'},
+                {
+                    'tagnode': 'dp0s4',
+                    'vyatta-interfaces-policy-v1:policy': {
+                        'vyatta-policy-qos-v1:qos': 'policy-2'
+                    },
+                    'vif': [
+                        {
+                            'tagnode': 10,
+                            'vyatta-interfaces-policy-v1:policy': {
+                                'vyatta-policy-qos-v1:qos': 'policy-3'
+                            }
+                        }
+                    ]
+                }
+            ]
+        }
+    }
+    bond_membership = MagicMock()
+    bond_membership.get_bond_name.return_value = 'dp0bond1'
+
+    qos_op_mode = vyatta_policy_qos_vci.qos_op_mode
+    with patch('vyatta_policy_qos_vci.qos_op_mode.get_config') as mock_get_config:
+        mock_get_config.return_value = config
+        qos_op_mode.invalidate_caches()
+
+        assert qos_op_mode.get_if_subport_policy_name('dp0s4') == 'policy-2'
+        assert qos_op_mode.get_if_subport_policy_name('dp0s4 vif 10') == 'policy-3'
+        assert qos_op_mode.get_if_subport_policy_name('dp0s5') is None
+        assert qos_op_mode.get_if_subport_policy_name(
+            'dp0xe3', bond_membership) == 'policy-1'
+
+        qos_op_mode.invalidate_caches()
+
+
+def test_convert_pcp_or_des_map():
+    """
+    Unit-test the conversion of a pcp map, including the reverse map of
+    traffic-class/queue to pcp values.
+    """
+    # pcp 0-3 -> tc 3 queue 0, pcp 4-5 -> tc 1 queue 1, pcp 6-7 -> tc 0 queue 2
+    pcp_map_in = [3, 3, 3, 3, 5, 5, 8, 8]
+
+    map_list_out, reverse_map = (
+        vyatta_policy_qos_vci.qos_op_mode.convert_pcp_or_des_map(pcp_map_in,
+                                                                 'pcp'))
+
+    assert map_list_out[4] == {
+        'pcp': 4,
+        'vyatta-policy-qos-groupings-v1:traffic-class': 1,
+        'vyatta-policy-qos-groupings-v1:queue': 1
+    }
+    assert len(map_list_out) == 8
+    assert reverse_map == {
+        3: {0: [0, 1, 2, 3]},
+        1: {1: [4, 5]},
+        0: {2: [6, 7]}
+    }
+
+    map_list_out, stats_reverse_map = (
+        vyatta_policy_qos_vci.qos_op_mode.convert_pcp_or_des_map(
+            pcp_map_in, 'pcp', build_forward=False))
+
+    assert map_list_out is None
+    assert stats_reverse_map == reverse_map
+
+    # A designation map is converted the same way, but the Yang model
+    # doesn't have designation-values for the queues.
+    # designation 0-7 -> tc 0 queue 0
+    pipe_in = {
+        'designation': [0, 0, 0, 0, 0, 0, 0, 0],
+        'tc': [
+            [
+                {
+                    'packets': 1, 'bytes': 64, 'dropped': 0,
+                    'random_drop': 0, 'prio_local': False, 'qlen': 0
+                }
+            ]
+        ]
+    }
+
+    pipe_out = vyatta_policy_qos_vci.qos_op_mode.convert_pipe(
+        'stats', pipe_in, 1, 'profile-1')
+
+    queue = pipe_out['traffic-class-queues-list'][0]['queue-statistics'][0]
+    assert 'designation-values' not in queue
+    assert 'pcp-values' not in queue
+
+
+def test_convert_wred_map_lists():
+    """
+    Unit-test the conversion of a wred map into both the 32-bit and 64-bit
+    counter lists.
+    """
+    wred_map_in = [
+        {'res_grp': 'grp-1', 'random_dscp_drop': 0x100000001},
+        {'res_grp': 'grp-2', 'random_dscp_drop': 7}
+    ]
+
+    map_list_out, map_list_out_64 = (
+        vyatta_policy_qos_vci.qos_op_mode.convert_wred_map_lists(wred_map_in))
+
+    assert map_list_out == [
+        {'res-grp': 'grp-1', 'random-dscp-drop': 1},
+        {'res-grp': 'grp-2', 'random-dscp-drop': 7}
+    ]
+    assert map_list_out_64 == [
+        {'res-grp-64': 'grp-1', 'random-dscp-drop-64': '4294967297'},
+        {'res-grp-64': 'grp-2', 'random-dscp-drop-64': '7'}
+    ]
+
+
+def test_convert_tcs():
+    """
+    Unit-test that the traffic-class counters are truncated to 32-bits, and
+    that the dropped counters only count tail-drops.
+    """
+    tcs_in = [
+        {
+            'packets': 0x100000002,
+            'bytes': 0x1f0000000,
+            'dropped': 12,
+            'random_drop': 5
+        }
+    ]
+
+    tc_list_out = vyatta_policy_qos_vci.qos_op_mode.convert_tcs(tcs_in)
+
+    assert tc_list_out == [
+        {
+            'traffic-class': 0,
+            'vyatta-policy-qos-groupings-v1:packets': 2,
+            'vyatta-policy-qos-groupings-v1:bytes': 0xf0000000,
+            'vyatta-policy-qos-groupings-v1:dropped': 7,
+            'vyatta-policy-qos-groupings-v1:random-drop': 5,
+            'vyatta-policy-qos-groupings-v1:packets-64': '4294967298',
+            'vyatta-policy-qos-groupings-v1:bytes-64': '8321499136',
+            'vyatta-policy-qos-groupings-v1:dropped-64': '7',
+            'vyatta-policy-qos-groupings-v1:random-drop-64': '5'
+        }
+    ]
+
+
+def test_convert_if_list_invalidates_caches_on_error():
+    """
+    Unit-test that the cached config and indexes are thrown away even if the
+    conversion fails, so later requests don't see stale config.
+    """
+    qos_op_mode = vyatta_policy_qos_vci.qos_op_mode
+    with patch('vyatta_policy_qos_vci.qos_op_mode.get_config') as mock_get_config:
+        mock_get_config.return_value = {}
+        qos_op_mode.get_if_dict_index()
+        assert qos_op_mode.config is not None
+
+        # The dataplane JSON is missing the 'shaper' element
+        with pytest.raises(KeyError):
+            qos_op_mode.convert_if_list('all', {'dp0s4': {}})
+
+        assert qos_op_mode.config is None
+        assert qos_op_mode.if_dict_index is None
+        assert qos_op_mode.policy_profile_index is None
+
+
+def test_convert_pipe_stats():
+    """
+    Unit-test that a 'stats' request leaves out the dscp/pcp/designation
+    maps, but still converts the queue statistics.
+    """
+    pipe_in = {
+        # dscp 0-63 -> tc 0 queue 0
+        'dscp2q': [0] * 64,
+        'tc': [
+            [
+                {
+                    'packets': 1, 'bytes': 64, 'dropped': 0,
+                    'random_drop': 0, 'prio_local': False, 'qlen': 0
+                }
+            ]
+        ]
+    }
+
+    pipe_out = vyatta_policy_qos_vci.qos_op_mode.convert_pipe(
+        'stats', pipe_in, 1, 'profile-1')
+
+    assert 'dscp-to-queue-map' not in pipe_out
+    assert 'pcp-to-queue-map' not in pipe_out
+    assert 'designation-to-queue-map' not in pipe_out
+    queue = pipe_out['traffic-class-queues-list'][0]['queue-statistics'][0]
+    assert queue['vyatta-policy-qos-groupings-v1:packets'] == 1
+    assert queue['dscp-values'] == [{'dscp': dscp} for dscp in range(64)]
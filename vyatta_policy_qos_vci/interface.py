@@ -27,6 +27,9 @@ POLICY_KEY = {
     'bond_member': ('tagnode', 'vyatta-interfaces-policy-v1', '', 'vyatta-interfaces-bonding-qos-v1'),
 }
 
+INGRESS_MAP_KEY = 'vyatta-policy-qos-v1:ingress-map'
+EGRESS_MAP_KEY = 'vyatta-policy-qos-v1:egress-map'
+
 
 class MissingBondGroupError(Exception):
     def __init__(self):
@@ -67,186 +70,135 @@ class Interface:
             vif_namespace = ''
             qos_namespace = ''
 
-        if_policy_dict = None
+        # Keys of the policy container and the vif list in this interface's
+        # namespaces
+        policy_key = f"{policy_namespace}:policy"
+        vif_key = f"{vif_namespace}vif"
+
         port_params_dict = None
         # Get the trunk's QoS policy name
-        try:
+        if if_type == 'bond_member':
+            # Check if policy is on L3 bonding interface
+            if_policy_dict = bond_dict.get(policy_key)
+        else:
+            # Try the normal vyatta VM style
+            if_policy_dict = if_dict.get(policy_key)
+
+        if if_policy_dict is None:
+            # Try the hardware-switch platform style
             if if_type == 'bond_member':
-                # Check if policy is on L3 bonding interface
-                if_policy_dict = bond_dict[f"{policy_namespace}:policy"]
+                # No policy on L3 bonding interface,
+                # check if policy is on L2 LAG interface
+                # L2 and L3 LAG QoS policies are in different namespaces
+                qos_namespace = 'vyatta-policy-qos-v1'
+                switch_group_dict = bond_dict.get(
+                    'vyatta-interfaces-bonding-switch-v1:switch-group', {})
             else:
-                # Try the normal vyatta VM style
-                if_policy_dict = if_dict[f"{policy_namespace}:policy"]
-
-        except KeyError:
-            try:
-                # Try the hardware-switch platform style
-                if if_type == 'bond_member':
-                    # No policy on L3 bonding interface,
-                    # check if policy is on L2 LAG interface
-                    # L2 and L3 LAG QoS policies are in different namespaces
-                    qos_namespace = 'vyatta-policy-qos-v1'
-                    if_policy_dict = bond_dict[
-                        'vyatta-interfaces-bonding-switch-v1:switch-group']
-                else:
-                    if_policy_dict = if_dict[
-                        'vyatta-interfaces-dataplane-switch-v1:switch-group']
-                port_params_dict = if_policy_dict['port-parameters']
-                if_policy_dict = port_params_dict[
-                    'vyatta-interfaces-switch-policy-v1:policy']
-            except KeyError:
-                pass
+                switch_group_dict = if_dict.get(
+                    'vyatta-interfaces-dataplane-switch-v1:switch-group', {})
+            port_params_dict = switch_group_dict.get('port-parameters')
+            if port_params_dict is not None:
+                if_policy_dict = port_params_dict.get(
+                    'vyatta-interfaces-switch-policy-v1:policy')
+
+        # The bond_member fallback above may have changed the qos namespace
+        qos_key = f"{qos_namespace}:qos"
 
         # If there is just an ingress map attached at the vif/vlan
         # level then there might be nothing on the interface itself.
         if if_policy_dict is not None:
-            try:
-                if_policy_name = if_policy_dict.get(f'{qos_namespace}:qos')
-                policy = None
-                if if_policy_name is not None:
-                    policy = qos_policy_dict[if_policy_name]
-                    if policy is not None:
-                        subport = Subport(self, 0, 0, policy)
-                        self._subports.append(subport)
-                        # cross-link the policy and the interface
-                        self._policies.append(policy)
-                        policy.add_interface(self)
-            except KeyError:
-                # Maybe there is no policy on this interface
-                pass
-
-            try:
-                ingress_map_name = if_policy_dict['vyatta-policy-qos-v1:ingress-map']
-                ingress_map = ingress_map_dict[ingress_map_name]
-                binding = IngressMapBinding(self, 0, ingress_map)
-                # cross-link the ingress-map and the binding
-                self._ingress_map_bindings.append(binding)
-                ingress_map.add_binding(binding)
-
-            except KeyError:
-                # Maybe there is no ingress map for this interface
-                pass
-
-            try:
-                egress_map_name = if_policy_dict['vyatta-policy-qos-v1:egress-map']
-                egress_map = egress_map_dict[egress_map_name]
-                binding = EgressMapBinding(self, 0, egress_map)
-                # cross-link the egress-map and the binding
-                self._egress_map_bindings.append(binding)
-                egress_map.add_binding(binding)
-
-            except KeyError:
-                # Maybe there is no egress map for this interface
-                pass
+            self._add_subport(0, 0, if_policy_dict, qos_key, qos_policy_dict,
+                              ingress_map_dict, egress_map_dict)
 
         # Look for subports
 
         # Try the normal vyatta VM style
-        vif_list = if_dict.get(f"{vif_namespace}vif")
+        vif_list = if_dict.get(vif_key)
         if vif_list is not None:
             subport_id = 1
             for vif in vif_list:
-                vlan_id = vif['tagnode']
-                if_policy_dict = vif[f"{policy_namespace}:policy"]
-                try:
-                    if_policy_name = if_policy_dict[f'{qos_namespace}:qos']
-                    policy = None
-                    if if_policy_name is not None:
-                        policy = qos_policy_dict[if_policy_name]
-                        if policy is not None:
-                            subport = Subport(self, subport_id, vlan_id, policy)
-                            self._subports.append(subport)
-                            # cross-link the policy and interface
-                            self._policies.append(policy)
-                            policy.add_interface(self)
-                            subport_id += 1
-
-                except KeyError:
-                    # Maybe there's no policy on this vif
-                    pass
-
-                try:
-                    ingress_map_name = if_policy_dict['vyatta-policy-qos-v1:ingress-map']
-                    ingress_map = ingress_map_dict[ingress_map_name]
-                    binding = IngressMapBinding(self, vlan_id, ingress_map)
-                    # cross-link the ingress-map and the binding
-                    self._ingress_map_bindings.append(binding)
-                    ingress_map.add_binding(binding)
-
-                except KeyError:
-                    # Maybe there's no ingress map for this vif
-                    pass
-
-                try:
-                    egress_map_name = if_policy_dict['vyatta-policy-qos-v1:egress-map']
-                    egress_map = egress_map_dict[egress_map_name]
-                    binding = EgressMapBinding(self, vlan_id, egress_map)
-                    # cross-link the egress-map and the binding
-                    self._egress_map_bindings.append(binding)
-                    egress_map.add_binding(binding)
-
-                except KeyError:
-                    # Maybe there's no egress map for this vif
-                    pass
+                if self._add_subport(subport_id, vif['tagnode'],
+                                     vif[policy_key], qos_key,
+                                     qos_policy_dict, ingress_map_dict,
+                                     egress_map_dict):
+                    subport_id += 1
 
         # Try the SIAD hardware-switch platform style
         vlan_list = None
         if port_params_dict is not None:
-            try:
-                vlan_params_dict = port_params_dict['vlan-parameters']
-                qos_params_dict = vlan_params_dict['qos-parameters']
-                vlan_list = qos_params_dict['vlan']
-
-            except KeyError:
-                pass
+            vlan_params_dict = port_params_dict.get('vlan-parameters', {})
+            qos_params_dict = vlan_params_dict.get('qos-parameters', {})
+            vlan_list = qos_params_dict.get('vlan')
 
         if vlan_list is not None:
             subport_id = 1
             for vlan in vlan_list:
-                vlan_id = vlan['vlan-id']
-                if_policy_dict = vlan['vyatta-interfaces-switch-policy-v1:policy']
-                if_policy_name = if_policy_dict.get(f'{qos_namespace}:qos')
-                policy = None
-                if if_policy_name is not None:
-                    policy = qos_policy_dict[if_policy_name]
-
-                if policy is not None:
-                    subport = Subport(self, subport_id, vlan_id, policy)
-                    self._subports.append(subport)
-                    # cross-link the policy and interface
-                    self._policies.append(policy)
-                    policy.add_interface(self)
+                if self._add_subport(subport_id, vlan['vlan-id'],
+                                     vlan['vyatta-interfaces-switch-policy-v1:policy'],
+                                     qos_key, qos_policy_dict,
+                                     ingress_map_dict, egress_map_dict):
                     subport_id += 1
 
-                try:
-                    ingress_map_name = if_policy_dict['vyatta-policy-qos-v1:ingress-map']
-                    ingress_map = ingress_map_dict[ingress_map_name]
-                    binding = IngressMapBinding(self, vlan_id, ingress_map)
-                    # cross-link the ingress-map and the binding
-                    self._ingress_map_bindings.append(binding)
-                    ingress_map.add_binding(binding)
-
-                except KeyError:
-                    # Maybe there's no ingress map for this vlan
-                    pass
-
-                try:
-                    egress_map_name = if_policy_dict['vyatta-policy-qos-v1:egress-map']
-                    egress_map = egress_map_dict[egress_map_name]
-                    binding = EgressMapBinding(self, vlan_id, egress_map)
-                    # cross-link the egress-map and the binding
-                    self._egress_map_bindings.append(binding)
-                    egress_map.add_binding(binding)
-
-                except KeyError:
-                    # Maybe there's no egress map for this vlan
-                    pass
-
         for subport in self._subports:
             subport.build_profile_index(self)
 
+        # Nothing is added to these once the interface has been built
+        self._subports = tuple(self._subports)
+        self._policies = tuple(self._policies)
+        self._ingress_map_bindings = tuple(self._ingress_map_bindings)
+        self._egress_map_bindings = tuple(self._egress_map_bindings)
+
+    def _add_subport(self, subport_id, vlan_id, if_policy_dict, qos_key,
+                     qos_policy_dict, ingress_map_dict, egress_map_dict):
+        """
+        Add a subport for the QoS policy, and bindings for the ingress-map
+        and egress-map, attached to the trunk or vlan described by
+        if_policy_dict.  Return True if a subport was added.
+        """
+        subport_added = False
+        if_policy_name = if_policy_dict.get(qos_key)
+        if if_policy_name is not None:
+            # Maybe there's no policy on this trunk or vlan
+            policy = qos_policy_dict.get(if_policy_name)
+            if policy is not None:
+                subport = Subport(self, subport_id, vlan_id, policy)
+                self._subports.append(subport)
+                # cross-link the policy and interface
+                self._policies.append(policy)
+                policy.add_interface(self)
+                subport_added = True
+
+        ingress_map_name = if_policy_dict.get(INGRESS_MAP_KEY)
+        # Maybe there's no ingress map for this trunk or vlan
+        ingress_map = ingress_map_dict.get(ingress_map_name)
+        if ingress_map is not None:
+            binding = IngressMapBinding(self, vlan_id, ingress_map)
+            # cross-link the ingress-map and the binding
+            self._ingress_map_bindings.append(binding)
+            ingress_map.add_binding(binding)
+
+        egress_map_name = if_policy_dict.get(EGRESS_MAP_KEY)
+        # Maybe there's no egress map for this trunk or vlan
+        egress_map = egress_map_dict.get(egress_map_name)
+        if egress_map is not None:
+            binding = EgressMapBinding(self, vlan_id, egress_map)
+            # cross-link the egress-map and the binding
+            self._egress_map_bindings.append(binding)
+            egress_map.add_binding(binding)
+
+        return subport_added
+
     def __eq__(self, interface):
         """ Compare the original JSON dictionaires of two interfaces """
+        if self is interface:
+            return True
+        if not isinstance(interface, Interface):
+            return NotImplemented
+        # Interfaces with different names can't have the same JSON, so
+        # avoid comparing the whole of both dictionaries
+        if self._name != interface.ifname:
+            return False
+
         if self._if_type != 'bond_member':
             if self._if_dict == interface.if_dict:
                 return True
@@ -261,6 +213,10 @@ class Interface:
 
         return False
 
+    def __hash__(self):
+        """ Interfaces that compare equal always have the same name """
+        return hash(self._name)
+
     @property
     def if_dict(self):
         """ Return the original JSON for this interface """
@@ -291,18 +247,18 @@ class Interface:
         zero, the second profile an index of one, and so on.
         The global profiles get added to the dictionary first, and
         hence have the lowest indicies.
-        The key for each global profile is "global <profile-name>"
+        The key for each global profile is ("global", <profile-name>)
         Then each subport policy on the interface adds its local
         profiles to the profile-index.
-        The key for each subport profile is "<vlan-id> <profile-name>".
+        The key for each subport profile is (<vlan-id>, <profile-name>).
         The trunk port is identified by vlan-id 0.
         So we could end up with the following profile-index:
-        {"global bill": 0,
-         "global fred": 1,
-         "0 paul": 2,
-         "0 bert": 3,
-         "10 alan": 4,
-         "20 pete": 5}
+        {("global", "bill"): 0,
+         ("global", "fred"): 1,
+         (0, "paul"): 2,
+         (0, "bert"): 3,
+         (10, "alan"): 4,
+         (20, "pete"): 5}
         """
         return self._profile_index.get(key)
 
@@ -318,7 +274,7 @@ class Interface:
     @property
     def policies(self):
         """
-        Return the list of policies (trunk and vlan) attached to this
+        Return the tuple of policies (trunk and vlan) attached to this
         interface
         """
         return self._policies
@@ -326,7 +282,7 @@ class Interface:
     @property
     def ingress_map_bindings(self):
         """
-        Return the list of ingress-maps that are bound to this interface or
+        Return the tuple of ingress-maps that are bound to this interface or
         any vlans associated with this interface.
         """
         return self._ingress_map_bindings
@@ -334,7 +290,7 @@ class Interface:
     @property
     def egress_map_bindings(self):
         """
-        Return the list of egress-maps that are bound to this interface or
+        Return the tuple of egress-maps that are bound to this interface or
         any vlans associated with this interface.
         """
         return self._egress_map_bindings
@@ -350,12 +306,16 @@ class Interface:
         max_pipes = 0
         queue_limit_type = "ql_bytes" if byte_limits() else "ql_packets"
 
+        # Only the trunk policy on subport 0 has a frame-overhead
+        overhead = 0
+        if self._subports:
+            trunk = self._subports[0]
+            if trunk.id == 0 and trunk.policy is not None:
+                overhead = trunk.policy.overhead
+
         for subport in self._subports:
             if subport.policy is not None:
                 max_pipes = subport.policy.max_pipes(max_pipes)
-                # Only the trunk policy on subport 0 has a frame-overhead
-                if subport.id == 0:
-                    overhead = subport.policy.overhead
 
         if max_pipes != 0:
             cmd = (f"{cmd_prefix} port subports {max_subports} "
@@ -364,7 +324,7 @@ class Interface:
             cmd_list.append(cmd)
 
         for subport in self._subports:
-            cmd_list += subport.commands(self)
+            cmd_list.extend(subport.commands(self))
 
         if max_pipes != 0:
             cmd_list.append(f"{cmd_prefix} enable")
@@ -110,7 +110,7 @@ class Profile:
 
     def commands(self, cmd_prefix, interface, vlan_id):
         """ Generate the list of profile commands """
-        profile_key = f"{vlan_id} {self._profile_name}"
+        profile_key = (vlan_id, self._profile_name)
         profile_id = interface.profile_index_get(profile_key)
         cmd_prefix = f"{cmd_prefix} {profile_id}"
         cmd_list = []
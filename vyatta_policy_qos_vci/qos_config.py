@@ -60,11 +60,9 @@ class QosConfig:
     def _process_action(self, action_dict):
         """ Process the action dictionary to create action objects """
         if action_dict is not None:
-            action_list = action_dict.get('name')
-            if action_list is not None:
-                for act_dict in action_list:
-                    action = Action(act_dict)
-                    self._action_groups[action.name] = action
+            for act_dict in action_dict.get('name') or ():
+                action = Action(act_dict)
+                self._action_groups[action.name] = action
 
     def _process_qos(self, qos_dict):
         """
@@ -85,28 +83,20 @@ class QosConfig:
                 self._plat_lp_des = PlatformLPDes(lp_des)
 
         # Process mark-maps
-        mark_maps_list = qos_dict.get('mark-map')
-        if mark_maps_list is not None:
-            for mark_map_dict in mark_maps_list:
-                mark_map = MarkMap(mark_map_dict)
-                self._mark_maps[mark_map.name] = mark_map
+        for mark_map_dict in qos_dict.get('mark-map') or ():
+            mark_map = MarkMap(mark_map_dict)
+            self._mark_maps[mark_map.name] = mark_map
 
         # Process global QoS profiles
-        global_profiles_list = qos_dict.get('profile')
-        if global_profiles_list is not None:
-            profile_id = 0
-            for profile_dict in global_profiles_list:
-                profile = Profile(profile_id, profile_dict, None, None)
-                self._global_profiles[profile.name] = profile
-                profile_id += 1
+        for profile_id, profile_dict in enumerate(qos_dict.get('profile') or ()):
+            profile = Profile(profile_id, profile_dict, None, None)
+            self._global_profiles[profile.name] = profile
 
         # Process QoS policies that have been defined
-        policy_name_list = qos_dict.get('name')
-        if policy_name_list is not None:
-            for policy_dict in policy_name_list:
-                policy = Policy(policy_dict, self._global_profiles,
-                                self._mark_maps)
-                self._policies[policy.name] = policy
+        for policy_dict in qos_dict.get('name') or ():
+            policy = Policy(policy_dict, self._global_profiles,
+                            self._mark_maps)
+            self._policies[policy.name] = policy
 
     def _process_interfaces(self, if_dict):
         """ Process interfaces that have QoS policies attached to them """
@@ -120,17 +110,15 @@ class QosConfig:
 
     def _process_ingress_map(self, ingress_map_list):
         """ Process the ingress-map list """
-        if ingress_map_list is not None:
-            for ingress_map_dict in ingress_map_list:
-                in_map_obj = IngressMap(ingress_map_dict)
-                self._ingress_maps[in_map_obj.name] = in_map_obj
+        for ingress_map_dict in ingress_map_list or ():
+            in_map_obj = IngressMap(ingress_map_dict)
+            self._ingress_maps[in_map_obj.name] = in_map_obj
 
     def _process_egress_map(self, egress_map_list):
         """ Process the egress-map list """
-        if egress_map_list is not None:
-            for egress_map_dict in egress_map_list:
-                eg_map_obj = EgressMap(egress_map_dict)
-                self._egress_maps[eg_map_obj.name] = eg_map_obj
+        for egress_map_dict in egress_map_list or ():
+            eg_map_obj = EgressMap(egress_map_dict)
+            self._egress_maps[eg_map_obj.name] = eg_map_obj
 
     @property
     def interfaces(self):
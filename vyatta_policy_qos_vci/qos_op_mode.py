@@ -37,6 +37,7 @@ This module was translated from VR/vplane-config-qos/scripts/qos-op-mode.pl
 """
 
 import logging
+import os
 import re
 
 from vyatta_policy_qos_vci.provisioner import get_config
@@ -44,26 +45,79 @@ from vyatta_policy_qos_vci.provisioner import get_config
 TC_SHIFT = 2
 TC_MASK = 0x3
 WRR_MASK = 0x7
+# Truncates a 64-bit counter for the old 32-bit Yang leaves
+MASK32 = 0xFFFFFFFF
+# Matches the QoS class tag in an NPF rule's operation
+TAG_RE = re.compile(r'tag\(([0-9]+)\)')
 LOG = logging.getLogger('Policy QoS VCI')
 
-config = {}
+# The QoS configuration, fetched on first use
+config = None
+
+# Index of interface name to (position, interface JSON) built from config
+if_dict_index = None
+
+# Index of policy name to {pipe-id: profile name} built from config
+policy_profile_index = None
+
+# sysfs values already read, keyed by (ifname, valuename)
+sysfs_values = {}
+
+
+def _get_config():
+    """
+    Return the QoS configuration, fetching it on first use.  It is cached
+    until invalidate_caches is called.
+    """
+    global config
+
+    if config is None:
+        config = get_config() or {}
+
+    return config
+
+
+def invalidate_caches():
+    """
+    Throw away the configuration, the indexes built from it, and any sysfs
+    values read, so the next op-mode conversion starts afresh.
+    """
+    global config
+    global if_dict_index
+    global policy_profile_index
+
+    config = None
+    if_dict_index = None
+    policy_profile_index = None
+    sysfs_values.clear()
 
 
 def get_sysfs_value(ifname, valuename):
     """
-    Return the value of a Linux sysfs interface attribute or an empty string
-    if the sysfs file does not exist.
+    Return the value of a Linux sysfs interface attribute or None if the
+    sysfs file does not exist.  Values are cached until the end of the
+    current op-mode conversion.
     """
-    value = ""
-    filename = "/sys/class/net/{}/{}".format(ifname, valuename)
+    key = (ifname, valuename)
+    if key in sysfs_values:
+        return sysfs_values[key]
+
+    filename = f"/sys/class/net/{ifname}/{valuename}"
     try:
-        with open(filename, 'r') as data:
-            value = data.read()
+        # sysfs attributes are tiny, so a single unbuffered read is enough
+        fd = os.open(filename, os.O_RDONLY)
+        try:
+            value = os.read(fd, 4096)
+        finally:
+            os.close(fd)
     except OSError:
         LOG.error(f"Failed to open {filename}")
+        sysfs_values[key] = None
         return None
 
-    return value.strip()
+    # sysfs values end with a newline
+    sysfs_values[key] = value.rstrip().decode()
+    return sysfs_values[key]
 
 
 def get_port_policy_name(if_type_dict):
@@ -153,85 +207,105 @@ def get_vlan_policy_name(if_type_dict, vlan_tag):
     return None
 
 
+def get_if_dict_index():
+    """
+    Return a dictionary indexing each configured interface's JSON by
+    interface name, built on first use, so that looking up a subport's
+    interface doesn't need to search every configured interface.
+    Each entry also records the interface's position in the configuration.
+    """
+    global if_dict_index
+
+    if if_dict_index is None:
+        if_dict_index = {}
+        if_types_dict = _get_config().get('vyatta-interfaces-v1:interfaces')
+        if if_types_dict is not None:
+            position = 0
+            for if_type, if_list in if_types_dict.items():
+                if_type = if_type.split(':')[1]
+                if if_type == 'vhost':
+                    if_name_key = 'name'
+                else:
+                    if_name_key = 'tagnode'
+
+                for if_dict in if_list:
+                    # Keep the first interface found with a given name
+                    if_dict_index.setdefault(if_dict[if_name_key],
+                                             (position, if_dict))
+                    position += 1
+
+    return if_dict_index
+
+
 def get_if_subport_policy_name(subport_name, bond_membership=None):
     """
     Return the policy name attached to this specified subport name.
     The subport name is in the form "<if-name>[ vif <vlan-tag>]".
     """
-    global config
     bond_name = None
 
-    index = subport_name.find(' vif ')
-    if index == -1:
-        if_name = subport_name
+    if_name, vif, vlan_tag = subport_name.partition(' vif ')
+    if not vif:
         vlan_tag = None
-    else:
-        if_name = subport_name[:index]
-        vlan_tag = subport_name[index+5:]
-
-    if config == {}:
-        config = get_config()
 
     if bond_membership is not None:
         bond_name = bond_membership.get_bond_name(if_name)
 
-    if_types_dict = config.get('vyatta-interfaces-v1:interfaces')
-    if if_types_dict is not None:
-        for if_type, if_list in if_types_dict.items():
-            if_type = if_type.split(':')[1]
-            if if_type == 'vhost':
-                if_name_key = 'name'
-            else:
-                if_name_key = 'tagnode'
+    # Use whichever of the interface and its bonding group is configured
+    # first
+    interfaces = get_if_dict_index()
+    matches = [interfaces[name] for name in (if_name, bond_name)
+               if name in interfaces]
+    if matches:
+        _, if_dict = min(matches, key=lambda match: match[0])
+        if vlan_tag is None:
+            return get_port_policy_name(if_dict)
 
-            for if_dict in if_list:
-                if if_dict[if_name_key] in [if_name, bond_name]:
-                    if vlan_tag is None:
-                        return get_port_policy_name(if_dict)
-
-                    return get_vlan_policy_name(if_dict, vlan_tag)
+        return get_vlan_policy_name(if_dict, vlan_tag)
 
     return None
 
 
-def get_policy_class_profile_name(policy_name, pipe_id):
+def get_policy_profile_index():
     """
-    Return the profile name for the policy/pipe combination.
-    pipe_id = 0 for the default profile, 1-255 for class profiles.
-    May return None.
+    Return a dictionary, keyed by policy name, of dictionaries mapping each
+    of the policy's pipe-ids to its profile name.  Pipe-id 0 maps to the
+    default profile.  The index is built on first use so that each
+    pipe's profile can be found without searching the configuration.
     """
-    global config
+    global policy_profile_index
 
-    if config == {}:
-        config = get_config()
+    if policy_profile_index is None:
+        policy_profile_index = {}
+        policy_dict = _get_config().get('vyatta-policy-v1:policy')
+        if policy_dict is not None:
+            qos_policy_dict = policy_dict.get('vyatta-policy-qos-v1:qos')
+            policy_name_list = qos_policy_dict['name']
+            for policy in policy_name_list:
+                if policy['id'] in policy_profile_index:
+                    continue
 
-    policy_dict = config.get('vyatta-policy-v1:policy')
-    if policy_dict is not None:
-        qos_policy_dict = policy_dict.get('vyatta-policy-qos-v1:qos')
-        policy_name_list = qos_policy_dict['name']
-        for policy in policy_name_list:
-            if policy['id'] == policy_name:
                 shaper_dict = policy['shaper']
-                if pipe_id == 0:
-                    return shaper_dict.get('default')
-
+                pipe_profiles = {0: shaper_dict.get('default')}
                 class_list = shaper_dict.get('class')
                 if class_list is not None:
                     for class_dict in class_list:
-                        if class_dict['id'] == pipe_id:
-                            return class_dict.get('profile')
-
-    return None
+                        pipe_profiles.setdefault(class_dict['id'],
+                                                 class_dict.get('profile'))
 
+                policy_profile_index[policy['id']] = pipe_profiles
 
-def get_traffic_class(qmap_value):
-    """ Extract the traffic-class from a qmap value """
-    return qmap_value & TC_MASK
+    return policy_profile_index
 
 
-def get_queue_number(qmap_value):
-    """ Extract the wrr-id from a qmap value """
-    return (qmap_value >> TC_SHIFT) & WRR_MASK
+def get_policy_class_profile_name(policy_name, pipe_id):
+    """
+    Return the profile name for the policy/pipe combination.
+    pipe_id = 0 for the default profile, 1-255 for class profiles.
+    May return None.
+    """
+    pipe_profiles = get_policy_profile_index().get(policy_name, {})
+    return pipe_profiles.get(pipe_id)
 
 
 def convert_tc_rates(tc_rates_in):
@@ -239,19 +313,14 @@ def convert_tc_rates(tc_rates_in):
     Convert a 'tc_rates' JSON array into Yang compatible 'tagged' JSON array,
     tagged by traffic-class-id (0..3)
     """
-    tc_rates_out = []
-    tc_id = 0
-
-    for tc_rate in tc_rates_in:
-        tc_rate_out = {
+    return [
+        {
             'traffic-class': tc_id,
-            'rate': (tc_rate & 0xFFFFFFFF),
+            'rate': tc_rate & MASK32,
             'rate-64': f"{tc_rate}"
         }
-        tc_rates_out.append(tc_rate_out)
-        tc_id += 1
-
-    return tc_rates_out
+        for tc_id, tc_rate in enumerate(tc_rates_in)
+    ]
 
 
 def convert_wrr_weights(wrr_weights_in):
@@ -259,161 +328,94 @@ def convert_wrr_weights(wrr_weights_in):
     Convert a 'wrr_weights' JSON array into Yang compatible 'tagged' JSON array
     tagged by wrr-queue-id (0..7)
     """
-    wrr_weights_out = []
-    queue_id = 0
-
-    for wrr in wrr_weights_in:
-        wrr_weight_out = {
+    return [
+        {
             'queue': queue_id,
             'weight': wrr
         }
-        wrr_weights_out.append(wrr_weight_out)
-        queue_id += 1
+        for queue_id, wrr in enumerate(wrr_weights_in)
+    ]
 
-    return wrr_weights_out
 
-
-def convert_dscp_map(dscp_map_in):
+def convert_qmap(map_in, map_type, build_forward=True):
     """
-    Convert a 'dscp2q' JSON array into Yang compatible 'tagged' JSON array,
-    tagged by dscp-value (0..63).
-    Also build a tc-id/wrr-id to dscp mapping.
+    Convert a 'dscp2q', 'pcp2q' or 'designation' JSON array of qmap values
+    into Yang compatible 'tagged' JSON array, tagged by map_type value.
+    Also build a tc-id/wrr-id to map_type value mapping.
+    If build_forward is False only the mapping is built, and None is
+    returned in place of the Yang JSON array.
     """
-    dscp_map_out = []
-    tc_queue_to_dscp_map = {}
-    dscp_id = 0
-
-    if dscp_map_in is not None:
-        for dscp_map_value in dscp_map_in:
-            tc_id = get_traffic_class(dscp_map_value)
-            q_id = get_queue_number(dscp_map_value)
-
-            dscp_out = {
-                'dscp': dscp_id,
-                # The following two elements are defined in
-                # vyatta-policy-qos-groupings-v1.yang hence the need
-                # to include their namespace.
-                'vyatta-policy-qos-groupings-v1:traffic-class': tc_id,
-                'vyatta-policy-qos-groupings-v1:queue': q_id
-            }
-            dscp_map_out.append(dscp_out)
-
-            try:
-                dscp_values = tc_queue_to_dscp_map[tc_id][q_id]
-
-            except KeyError:
-                dscp_values = []
-
-            dscp_values.append(dscp_id)
+    map_in = map_in or ()
 
-            try:
-                tc_queue_to_dscp_map[tc_id][q_id] = dscp_values
+    # The traffic-class and wrr-id are extracted from each qmap value.
+    # The traffic-class and queue elements are defined in
+    # vyatta-policy-qos-groupings-v1.yang hence the need to include their
+    # namespace.
+    map_list_out = None
+    if build_forward:
+        map_list_out = [
+            {
+                map_type: map_id,
+                'vyatta-policy-qos-groupings-v1:traffic-class': qmap_value & TC_MASK,
+                'vyatta-policy-qos-groupings-v1:queue': (qmap_value >> TC_SHIFT) & WRR_MASK
+            }
+            for map_id, qmap_value in enumerate(map_in)
+        ]
 
-            except KeyError:
-                try:
-                    tc_queue_to_dscp_map[tc_id] = {}
-                    tc_queue_to_dscp_map[tc_id][q_id] = dscp_values
+    tc_queue_to_map = {}
+    for map_id, qmap_value in enumerate(map_in):
+        tc_id = qmap_value & TC_MASK
+        q_id = (qmap_value >> TC_SHIFT) & WRR_MASK
+        tc_queue_to_map.setdefault(tc_id, {}).setdefault(q_id, []).append(map_id)
 
-                except KeyError:
-                    pass
+    return map_list_out, tc_queue_to_map
 
-            dscp_id += 1
 
-    return dscp_map_out, tc_queue_to_dscp_map
+def convert_dscp_map(dscp_map_in, build_forward=True):
+    """
+    Convert a 'dscp2q' JSON array into Yang compatible 'tagged' JSON array,
+    tagged by dscp-value (0..63).
+    Also build a tc-id/wrr-id to dscp mapping.
+    """
+    return convert_qmap(dscp_map_in, 'dscp', build_forward)
 
 
-def convert_pcp_or_des_map(map_in, map_type):
+def convert_pcp_or_des_map(map_in, map_type, build_forward=True):
     """
     Convert a 'pcp' or 'designation' JSON array into Yang compatible 'tagged'
     JSON array, tagged by pcp-value or designation-value (0..7).
     Also build a tc-id/wrr-id to pcp/designation mapping.
     """
-    map_list_out = []
-    tc_queue_to_map = []
-    map_id = 0
-
-    if map_in is not None:
-        for qmap_value in map_in:
-            tc_id = get_traffic_class(qmap_value)
-            q_id = get_queue_number(qmap_value)
-
-            map_out = {
-                map_type: map_id,
-                # The following two elements are defined in
-                # vyatta-policy-qos-groupings-v1.yang hence the need
-                # to include their namespace.
-                'vyatta-policy-qos-groupings-v1:traffic-class': tc_id,
-                'vyatta-policy-qos-groupings-v1:queue': q_id
-            }
-            map_list_out.append(map_out)
-
-            try:
-                map_values = tc_queue_to_map[tc_id][q_id]
-
-            except IndexError:
-                map_values = []
-
-            map_values.append(map_id)
-
-            try:
-                tc_queue_to_map[tc_id][q_id] = map_values
-
-            except IndexError:
-                try:
-                    tc_queue_to_map[tc_id] = {}
-                    tc_queue_to_map[tc_id][q_id] = map_values
-
-                except IndexError:
-                    pass
-
-            map_id += 1
-
-    return map_list_out, tc_queue_to_map
+    return convert_qmap(map_in, map_type, build_forward)
 
 
 def convert_map_list(map_list, map_type):
     """ Convert either a dscp or pcp reversed map into Yang JSON format """
-    map_list_out = []
-
-    for value in map_list:
-        value_out = {map_type: value}
-        map_list_out.append(value_out)
+    return [{map_type: value} for value in map_list]
 
-    return map_list_out
 
-
-def convert_wred_map_list(map_list_in):
+def convert_wred_map_lists(map_list_in):
     """
-    Convert a 'wred_map' JSON array into Yang compatible 'tagged' JSON array,
-    tagged by the resource-group name
+    Convert a 'wred_map' JSON array into a pair of Yang compatible 'tagged'
+    JSON arrays, tagged by the resource-group name.  The first array holds
+    the old 32-bit counters, the second the new 64-bit counters.
     """
     map_list_out = []
+    map_list_out_64 = []
 
     for map_in in map_list_in:
-        map_out = {
-            'res-grp': map_in['res_grp'],
-            'random-dscp-drop': map_in['random_dscp_drop'] & 0xffffffff
-        }
-        map_list_out.append(map_out)
+        res_grp = map_in['res_grp']
+        random_dscp_drop = map_in['random_dscp_drop']
+        map_list_out.append({
+            'res-grp': res_grp,
+            'random-dscp-drop': random_dscp_drop & MASK32
+        })
+        map_list_out_64.append({
+            'res-grp-64': f"{res_grp}",
+            'random-dscp-drop-64': f"{random_dscp_drop}"
+        })
 
-    return map_list_out
-
-
-def convert_wred_map_list_64(map_list_in):
-    """
-    Convert a 'wred_map' JSON array into Yang compatible 'tagged' JSON array,
-    tagged by the resource-group name
-    """
-    map_list_out = []
-
-    for map_in in map_list_in:
-        map_out = {
-            'res-grp-64': f"{map_in['res_grp']}",
-            'random-dscp-drop-64': f"{map_in['random_dscp_drop']}"
-        }
-        map_list_out.append(map_out)
-
-    return map_list_out
+    return map_list_out, map_list_out_64
 
 
 def convert_tc_queues(tc_queues_in, tc_id, reverse_map, map_type_values):
@@ -422,10 +424,17 @@ def convert_tc_queues(tc_queues_in, tc_id, reverse_map, map_type_values):
     compatible 'tagged' JSON array, tagged by wrr-queue-id (0..7)
     """
     tc_queues_out = []
-    queue_id = 0
 
-    for queue in tc_queues_in:
-        tail_drops = queue['dropped'] - queue['random_drop']
+    # drop the '-values' to get the map_type
+    map_type = map_type_values.split('-')[0]
+    tc_reverse_map = reverse_map.get(tc_id, {})
+
+    for queue_id, queue in enumerate(tc_queues_in):
+        packets = queue['packets']
+        num_bytes = queue['bytes']
+        random_drop = queue['random_drop']
+        # The dropped counter is total drops, we just want tail-drops
+        tail_drops = queue['dropped'] - random_drop
         queue_out = {
             'queue': queue_id,
 
@@ -433,62 +442,42 @@ def convert_tc_queues(tc_queues_in, tc_id, reverse_map, map_type_values):
             # vyatta-policy-qos-groupings-v1.yang hence the need to include
             # their namespace.
             # Truncate the value for the old 32-bit counters
-            'vyatta-policy-qos-groupings-v1:packets': (
-                queue['packets'] & 0xffffffff),
-            'vyatta-policy-qos-groupings-v1:bytes': (
-                queue['bytes'] & 0xffffffff),
-
-            # The dropped counter is total drops, we just want tail-drops
-            'vyatta-policy-qos-groupings-v1:dropped': ((
-                queue['dropped'] - queue['random_drop']) & 0xffffffff),
-            'vyatta-policy-qos-groupings-v1:random-drop': (
-                queue['random_drop'] & 0xffffffff),
+            'vyatta-policy-qos-groupings-v1:packets': packets & MASK32,
+            'vyatta-policy-qos-groupings-v1:bytes': num_bytes & MASK32,
+            'vyatta-policy-qos-groupings-v1:dropped': tail_drops & MASK32,
+            'vyatta-policy-qos-groupings-v1:random-drop': random_drop & MASK32,
 
             # Don't truncate the new 64-bit counters
-            'vyatta-policy-qos-groupings-v1:packets-64': f"{queue['packets']}",
-            'vyatta-policy-qos-groupings-v1:bytes-64': f"{queue['bytes']}",
-
-            # The dropped counter is total drops, we just want tail-drops
+            'vyatta-policy-qos-groupings-v1:packets-64': f"{packets}",
+            'vyatta-policy-qos-groupings-v1:bytes-64': f"{num_bytes}",
             'vyatta-policy-qos-groupings-v1:dropped-64': f"{tail_drops}",
-            'vyatta-policy-qos-groupings-v1:random-drop-64': f"{queue['random_drop']}",
+            'vyatta-policy-qos-groupings-v1:random-drop-64': f"{random_drop}",
 
             'priority-local': queue['prio_local']
 
         }
 
-        if queue.get('wred_map') is not None:
-            queue_out['vyatta-policy-qos-groupings-v1:wred-map'] = (
-                convert_wred_map_list(queue['wred_map']))
-
-        if queue.get('wred_map') is not None:
-            queue_out['vyatta-policy-qos-groupings-v1:wred-map-64'] = (
-                convert_wred_map_list_64(queue['wred_map']))
+        wred_map = queue.get('wred_map')
+        if wred_map is not None:
+            (queue_out['vyatta-policy-qos-groupings-v1:wred-map'],
+             queue_out['vyatta-policy-qos-groupings-v1:wred-map-64']) = (
+                convert_wred_map_lists(wred_map))
 
         if queue.get('qlen') is not None:
             queue_out['vyatta-policy-qos-groupings-v1:qlen'] = (
-                queue['qlen'] & 0xffffffff)
+                queue['qlen'] & MASK32)
             queue_out['vyatta-policy-qos-groupings-v1:qlen-packets'] = (
                 queue['qlen'])
         else:
             queue_out['vyatta-policy-qos-groupings-v1:qlen-bytes'] = (
                 queue['qlen-bytes'])
 
-        # drop the '-values' to get the map_type
-        map_type = map_type_values.split('-')[0]
-
         # Not all reverse-map lists may be populated
-        try:
-            cp_list = reverse_map[tc_id][queue_id]
+        cp_list = tc_reverse_map.get(queue_id)
+        if cp_list is not None:
             queue_out[map_type_values] = convert_map_list(cp_list, map_type)
 
-        except IndexError:
-            pass
-
-        except KeyError:
-            pass
-
         tc_queues_out.append(queue_out)
-        queue_id += 1
 
     return tc_queues_out
 
@@ -498,19 +487,14 @@ def convert_tc_queue_list(tc_queues_list_in, reverse_map, map_type_values):
     Convert a 'tc' JSON array into a Yang compatible 'tagged' JSON array
     tagged by traffic-class-id
     """
-    tc_queues_list_out = []
-    tc_id = 0
-
-    for tc_queues_in in tc_queues_list_in:
-        tc_queues_out = {
+    return [
+        {
             'traffic-class': tc_id,
             'queue-statistics': convert_tc_queues(tc_queues_in, tc_id,
                                                   reverse_map, map_type_values)
         }
-        tc_queues_list_out.append(tc_queues_out)
-        tc_id += 1
-
-    return tc_queues_list_out
+        for tc_id, tc_queues_in in enumerate(tc_queues_list_in)
+    ]
 
 
 def convert_pipe(cmd, pipe_in, pipe_id, profile_name):
@@ -529,7 +513,7 @@ def convert_pipe(cmd, pipe_in, pipe_id, profile_name):
         # vyatta-policy-qos-groupings-v1.yang hence we need to specify
         # their namespace.
         pipe_out['vyatta-policy-qos-groupings-v1:token-bucket-rate'] = (
-            (pipe_in['params']['tb_rate'] & 0xFFFFFFFF))
+            (pipe_in['params']['tb_rate'] & MASK32))
         pipe_out['vyatta-policy-qos-groupings-v1:token-bucket-rate-64'] = (
             f"{pipe_in['params']['tb_rate']}")
         pipe_out['vyatta-policy-qos-groupings-v1:token-bucket-size'] = (
@@ -543,32 +527,38 @@ def convert_pipe(cmd, pipe_in, pipe_id, profile_name):
         pipe_out['vyatta-policy-qos-groupings-v1:weighted-round-robin-weights'] = (
             convert_wrr_weights(pipe_in['params']['wrr_weights']))
 
+    # The map data isn't wanted if we are processing a 'stats' request, but
+    # the reverse maps are still needed to build the queue list
+    build_forward = cmd != 'stats'
+
     # We should only get one of dscp, pcp or designation map
     if 'dscp2q' in pipe_in:
-        pipe_out['dscp-to-queue-map'], reverse_dscp_map = convert_dscp_map(
-            pipe_in['dscp2q'])
+        dscp_map, reverse_dscp_map = convert_dscp_map(pipe_in['dscp2q'],
+                                                      build_forward)
+        if build_forward:
+            pipe_out['dscp-to-queue-map'] = dscp_map
         queue_list = convert_tc_queue_list(pipe_in['tc'], reverse_dscp_map,
                                            "dscp-values")
 
     if 'pcp2q' in pipe_in:
-        pipe_out['pcp-to-queue-map'], reverse_pcp_map = convert_pcp_or_des_map(
-            pipe_in['pcp2q'], 'pcp')
+        pcp_map, reverse_pcp_map = convert_pcp_or_des_map(
+            pipe_in['pcp2q'], 'pcp', build_forward)
+        if build_forward:
+            pipe_out['pcp-to-queue-map'] = pcp_map
         queue_list = convert_tc_queue_list(pipe_in['tc'], reverse_pcp_map,
                                            "pcp-values")
     if 'designation' in pipe_in:
-        pipe_out['designation-to-queue-map'], reverse_des_map = convert_pcp_or_des_map(
-            pipe_in['designation'], 'designation')
-        queue_list = convert_tc_queue_list(pipe_in['tc'], reverse_des_map,
+        des_map, _ = convert_pcp_or_des_map(
+            pipe_in['designation'], 'designation', build_forward)
+        if build_forward:
+            pipe_out['designation-to-queue-map'] = des_map
+        # The Yang queue-statistics list only has dscp-values and pcp-values,
+        # so designation values aren't added to the queues
+        queue_list = convert_tc_queue_list(pipe_in['tc'], {},
                                            "designation-values")
 
     pipe_out['traffic-class-queues-list'] = queue_list
 
-    if cmd == 'stats':
-        # Throw away the map data if we are processing a 'stats' request
-        del pipe_out['dscp-to-queue-map']
-        del pipe_out['pcp-to-queue-map']
-        del pipe_out['designation-to-queue-map']
-
     return pipe_out
 
 
@@ -578,21 +568,21 @@ def convert_pipes(cmd, pipes_in, subport_name, bond_membership=None):
     tagged by pipe-id
     """
     pipe_list_out = []
-    pipe_id = 0
     policy_name = get_if_subport_policy_name(subport_name, bond_membership)
 
     if policy_name is None:
-        print("policy_name not defined for {}".format(subport_name))
+        print(f"policy_name not defined for {subport_name}")
         return None
 
-    for pipe_in in pipes_in:
-        profile_name = get_policy_class_profile_name(policy_name, pipe_id)
-        if profile_name is not None:
-            pipe_out = convert_pipe(cmd, pipe_in, pipe_id, profile_name)
+    # Convert the pipes that the policy has a profile for, in pipe-id order
+    pipe_profiles = get_policy_profile_index().get(policy_name, {})
+    for pipe_id in sorted(pipe_profiles):
+        profile_name = pipe_profiles[pipe_id]
+        if profile_name is not None and pipe_id < len(pipes_in):
+            pipe_out = convert_pipe(cmd, pipes_in[pipe_id], pipe_id,
+                                    profile_name)
             pipe_list_out.append(pipe_out)
 
-        pipe_id += 1
-
     return pipe_list_out
 
 
@@ -602,35 +592,31 @@ def convert_tcs(tcs_in):
     tagged by traffic-class
     """
     tc_list_out = []
-    tc_id = 0
 
-    for tc_in in tcs_in:
-        tail_drops = tc_in['dropped'] - tc_in['random_drop']
+    for tc_id, tc_in in enumerate(tcs_in):
+        packets = tc_in['packets']
+        num_bytes = tc_in['bytes']
+        random_drop = tc_in['random_drop']
+        # The dropped counter is total drops, we just want tail-drops
+        tail_drops = tc_in['dropped'] - random_drop
         tc_out = {
             'traffic-class': tc_id,
             # Truncate these values for the old 32-bit counters
             # The following counters are defined in
             # vyatta-policy-qos-groupings-v1 hence we need to include their
             # namespace
-            'vyatta-policy-qos-groupings-v1:packets': tc_in['packets'] & 0xffffffff,
-            'vyatta-policy-qos-groupings-v1:bytes': tc_in['bytes'] & 0xfffffff,
-
-            # The dropped counter is total drops, we just want tail-drops
-            'vyatta-policy-qos-groupings-v1:dropped': (
-                (tc_in['dropped'] - tc_in['random_drop']) & 0xffffffff),
-            'vyatta-policy-qos-groupings-v1:random-drop': (
-                tc_in['random_drop'] & 0xffffffff),
+            'vyatta-policy-qos-groupings-v1:packets': packets & MASK32,
+            'vyatta-policy-qos-groupings-v1:bytes': num_bytes & MASK32,
+            'vyatta-policy-qos-groupings-v1:dropped': tail_drops & MASK32,
+            'vyatta-policy-qos-groupings-v1:random-drop': random_drop & MASK32,
 
             # 64-bit counters don't get truncated
-            'vyatta-policy-qos-groupings-v1:packets-64': f"{tc_in['packets']}",
-            'vyatta-policy-qos-groupings-v1:bytes-64': f"{tc_in['bytes']}",
-
-            # The dropped counter is total drops, we just want tail-drops
+            'vyatta-policy-qos-groupings-v1:packets-64': f"{packets}",
+            'vyatta-policy-qos-groupings-v1:bytes-64': f"{num_bytes}",
             'vyatta-policy-qos-groupings-v1:dropped-64': f"{tail_drops}",
-            'vyatta-policy-qos-groupings-v1:random-drop-64': f"{tc_in['random_drop']}"
+            'vyatta-policy-qos-groupings-v1:random-drop-64': f"{random_drop}"
         }
         tc_list_out.append(tc_out)
-        tc_id += 1
 
     return tc_list_out
 
@@ -642,22 +628,22 @@ def convert_npf_rule(rules_in):
     """
     rules_out = []
 
-    for rule_id in rules_in.keys():
-        rule_in = rules_in[rule_id]
+    for rule_id, rule_in in rules_in.items():
         rule_operation = rule_in['operation']
         rule_out = {
-            'rule-number': "{}".format(rule_id),
+            'rule-number': f"{rule_id}",
             'packets': f"{rule_in['packets']}",
             'bytes': f"{rule_in['bytes']}"
         }
 
-        search_obj = re.search(r'tag\(([0-9]+)\)', rule_operation, flags=0)
+        search_obj = TAG_RE.search(rule_operation)
         if search_obj:
-            rule_out['qos-class'] = "{}".format(search_obj.group(1))
+            rule_out['qos-class'] = search_obj.group(1)
 
         if "action-group" in rule_operation:
-            rule_out['action-group'] = rule_in['rprocs']['action-group']['name']
-            policer = rule_in['rprocs']['action-group'].get('policer')
+            action_group = rule_in['rprocs']['action-group']
+            rule_out['action-group'] = action_group['name']
+            policer = action_group.get('policer')
             if policer is not None:
                 rule_out['exceeded-packets'] = f"{policer['exceed-packets']}"
                 rule_out['exceeded-bytes'] = f"{policer['exceed-bytes']}"
@@ -677,26 +663,25 @@ def convert_groups(subport_ifname, group_list_in):
     Convert the 'groups' JSON array into a Yang compatible 'tagged' JSON array,
     tagged by 'name' which happens to be the port name
     """
-    group_list_out = []
-
-    if group_list_in is not None:
-        ifindex = get_sysfs_value(subport_ifname, 'ifindex')
-
-        for group_in in group_list_in:
-            group_out = {
-                'name': group_in['name'],
-                'class': group_in['class'],
-                'ifindex': ifindex,
-                'direction': group_in['direction'],
-                # The following element is defined in
-                # vyatta-policy-qos-groupings-v1.yang hence we need to specify
-                # its namespace.
-                'vyatta-policy-qos-groupings-v1:rule': convert_npf_rule(
-                    group_in['rules'])
-            }
-            group_list_out.append(group_out)
-
-    return group_list_out
+    if group_list_in is None:
+        return []
+
+    ifindex = get_sysfs_value(subport_ifname, 'ifindex')
+
+    return [
+        {
+            'name': group_in['name'],
+            'class': group_in['class'],
+            'ifindex': ifindex,
+            'direction': group_in['direction'],
+            # The following element is defined in
+            # vyatta-policy-qos-groupings-v1.yang hence we need to specify
+            # its namespace.
+            'vyatta-policy-qos-groupings-v1:rule': convert_npf_rule(
+                group_in['rules'])
+        }
+        for group_in in group_list_in
+    ]
 
 
 def convert_rules(subport_ifname, rules_in):
@@ -715,9 +700,11 @@ def convert_subports(cmd, subports_in, ifname, vlan_list, bond_membership=None):
     tagged by subport-id, subport 0 being the physical port
     """
     subport_list_out = []
-    subport_id = 0
 
-    for subport_in in subports_in:
+    # The vlan-tag carried by each subport, keyed by subport-id
+    vlan_tags = {vlan['subport']: vlan['tag'] for vlan in vlan_list}
+
+    for subport_id, subport_in in enumerate(subports_in):
         subport_out = {}
         subport_out['subport'] = subport_id
         if 'tc' in subport_in:
@@ -726,13 +713,10 @@ def convert_subports(cmd, subports_in, ifname, vlan_list, bond_membership=None):
         subport_name = ifname
         subport_ifname = ifname
 
-        if subport_id != 0:
-            for vlan in vlan_list:
-                if vlan['subport'] == subport_id:
-                    vif = vlan['tag']
-                    subport_name += " vif {}".format(vif)
-                    subport_ifname += ".{}".format(vif)
-                    break
+        vif = vlan_tags.get(subport_id) if subport_id != 0 else None
+        if vif is not None:
+            subport_name += f" vif {vif}"
+            subport_ifname += f".{vif}"
 
         subport_out['subport-name'] = subport_name
         subport_out['rules'] = convert_rules(subport_ifname,
@@ -742,7 +726,6 @@ def convert_subports(cmd, subports_in, ifname, vlan_list, bond_membership=None):
                                                      subport_out['subport-name'],
                                                      bond_membership)
         subport_list_out.append(subport_out)
-        subport_id += 1
 
     return subport_list_out
 
@@ -752,13 +735,8 @@ def convert_vlans(vlans_in):
     Convert the 'vlans' JSON array into a Yang compatible tagged JSON array,
     tagged by the 802.1Q vlan-tag
     """
-    vlan_list_out = []
-
-    for vlan in vlans_in:
-        vlan_out = {'tag': vlan['tag'], 'subport': vlan['subport']}
-        vlan_list_out.append(vlan_out)
-
-    return vlan_list_out
+    return [{'tag': vlan['tag'], 'subport': vlan['subport']}
+            for vlan in vlans_in]
 
 
 def convert_shaper(cmd, shaper_in, ifname, bond_membership=None):
@@ -778,7 +756,7 @@ def convert_shaper(cmd, shaper_in, ifname, bond_membership=None):
     return shaper_out
 
 
-def convert_if_list(cmd, op_mode_dict, bond_membership=None):
+def convert_if_list(cmd, op_mode_dict, bond_membership=None, sort=True):
     """
     Convert the op-mode JSON dictionary generate by the vyatta-dataplane into
     a Yang compatible JSON dictionary
@@ -786,20 +764,23 @@ def convert_if_list(cmd, op_mode_dict, bond_membership=None):
     cmd - either 'all' (full-results) or 'stats' (abbreviated-results)
     op_mode_dict - the op-mode JSON object generated by the vyatta-dataplane
     bond_membership - LAG membersip which contains bond name and member ports
+    sort - list the ports in name order, otherwise in op_mode_dict's order
 
     if_list_out - a tagged JSON array of QoS op-mode state of each physical port
     """
-    global config
-
-    if_list_out = []
-    for ifname, interface in sorted(op_mode_dict.items()):
-        shaper_in = interface['shaper']
-
-        if_shaper_out = {
-            'ifname': ifname,
-            'shaper': convert_shaper(cmd, shaper_in, ifname, bond_membership)
-        }
-        if_list_out.append(if_shaper_out)
+    ifnames = sorted(op_mode_dict) if sort else op_mode_dict
+    try:
+        if_list_out = [
+            {
+                'ifname': ifname,
+                'shaper': convert_shaper(cmd, op_mode_dict[ifname]['shaper'],
+                                         ifname, bond_membership)
+            }
+            for ifname in ifnames
+        ]
+    finally:
+        # Don't let a failed conversion leave stale config behind for the
+        # next request
+        invalidate_caches()
 
-    config.clear()
     return if_list_out
@@ -96,7 +96,7 @@ class Shaper:
         # First check to see if any global profiles need added
         base_pid = 0
         for profile_name in self._global_profiles:
-            key = f"global {profile_name}"
+            key = ("global", profile_name)
 
             if interface.profile_index_get(key) is None:
                 interface.profile_index_set(key, base_pid)
@@ -106,13 +106,13 @@ class Shaper:
         index = 0
         for profile_name in self._local_profiles:
             # Check for a global profile
-            key = f"global {profile_name}"
+            key = ("global", profile_name)
             pid = interface.profile_index_get(key)
             if pid is None:
                 # Get the next free profile index
                 pid = interface.profile_index_size
 
-            key = f"{vlan_id} {profile_name}"
+            key = (vlan_id, profile_name)
             interface.profile_index_set(key, pid)
             index += 1
 
@@ -176,10 +176,10 @@ class Shaper:
                 cmd_list += profile.commands(profile_prefix, interface, "global")
 
         # mapping default profile
-        default_profile_key = f"{vlan_id} {self._default}"
+        default_profile_key = (vlan_id, self._default)
         default_profile_id = interface.profile_index_get(default_profile_key)
         if default_profile_id is None:
-            default_profile_key = f"global {self._default}"
+            default_profile_key = ("global", self._default)
             default_profile_id = interface.profile_index_get(default_profile_key)
         cmd_list.append(f"{cmd_prefix} pipe {subport_id} 0 {default_profile_id}")
         for class_item in self._classes: